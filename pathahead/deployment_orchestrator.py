@@ -10,18 +10,35 @@ import json
 import yaml
 import csv
 import logging
+import logging.handlers
+import queue
+import atexit
+import math
 import subprocess
+import threading
 import asyncio
 import argparse
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 import concurrent.futures
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader
+except ImportError:
+    from yaml import SafeLoader as CSafeLoader
+
+# orjson speeds up handling of large Terraform outputs; fall back to json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configuration and Data Classes
-@dataclass
+@dataclass(slots=True, frozen=True)
 class VMTemplate:
     name: str
     vm_id: int
@@ -30,16 +47,16 @@ class VMTemplate:
     memory_mb: int
     disk_size_gb: int
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ProxmoxNode:
     name: str
     hostname: str
     available_cores: int
     available_memory_gb: int
     available_storage_gb: int
-    current_load: float = 0.0
+    current_load: Optional[float] = None  # EWMA of observed pressure, None until sampled
 
-@dataclass
+@dataclass(slots=True)
 class User:
     username: str
     email: str
@@ -47,7 +64,7 @@ class User:
     department: str
     vm_assignments: Dict[str, str] = None  # {vm_type: target_node}
 
-@dataclass
+@dataclass(slots=True)
 class VMDeployment:
     user: User
     vm_type: str
@@ -57,60 +74,127 @@ class VMDeployment:
     status: str = "pending"
 
 class DeploymentOrchestrator:
+    # Base configuration must finish first; the integration playbooks are independent
+    PRE_PLAYBOOKS = ('base_configuration.yml',)
+    PARALLEL_PLAYBOOKS = (
+        'guacamole_integration.yml',
+        'netbox_integration.yml',
+        'freeipa_integration.yml'
+    )
+
     def __init__(self, config_file: str = "config/settings.yaml"):
         self.config = self._load_config(config_file)
         self.setup_logging()
         self.templates = self._load_templates()
+        self._template_names = tuple(self.templates.keys())
         self.nodes = self._load_nodes()
+        self._playbooks = self._resolve_playbooks()
         self.users = []
         self.deployments = []
         
-        # Jinja2 template environment
+        # VM ID allocation is computed once per run, see _vm_ids
+        self._vm_ids_map = None
+        self._next_free_id = None
+        self._vm_ids_lock = threading.Lock()
+        
+        # Terraform is initialized once per run and shared by all batches
+        self._tf_init_done = False
+        self._tf_init_error = None
+        self._tf_init_lock = threading.Lock()
+        
+        # Jinja2 template environment, with compiled templates persisted across runs
+        os.makedirs('.jinja_cache', exist_ok=True)
         self.jinja_env = Environment(
             loader=FileSystemLoader('templates'),
             trim_blocks=True,
-            lstrip_blocks=True
+            lstrip_blocks=True,
+            auto_reload=False,
+            cache_size=400,
+            bytecode_cache=FileSystemBytecodeCache(directory='.jinja_cache')
         )
 
+        # Resolve templates once and reuse them for every batch
+        self._tf_main_tpl = self.jinja_env.get_template('terraform/main.tf.j2')
+        self._tf_vars_tpl = self.jinja_env.get_template('terraform/variables.tf.j2')
+        self._tf_tfvars_tpl = self.jinja_env.get_template('terraform/terraform.tfvars.j2')
+        self._tf_providers_tpl = self.jinja_env.get_template('terraform/providers.tf.j2')
+        self._ansible_inv_tpl = self.jinja_env.get_template('ansible/inventory.j2')
+        self._report_tpl = self.jinja_env.get_template('reports/deployment_summary.j2')
+        
+        # variables.tf, terraform.tfvars and the provider block only depend on global config,
+        # so render them once
+        global_vars = {
+            'vm_templates': self.templates,
+            'proxmox_config': self.config.get('proxmox', {}),
+            'network': self.config.get('network', {})
+        }
+        self._variables_tf_rendered = self._tf_vars_tpl.render(global_vars)
+        self._tfvars_rendered = self._tf_tfvars_tpl.render(global_vars)
+        self._providers_tf_rendered = self._tf_providers_tpl.render(global_vars)
+
     def _load_config(self, config_file: str) -> Dict:
         """Load configuration from YAML file"""
         try:
             with open(config_file, 'r') as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=CSafeLoader)
         except FileNotFoundError:
             print(f"Configuration file {config_file} not found")
             sys.exit(1)
 
     def setup_logging(self):
-        """Configure logging"""
+        """Configure logging; records are written by a background listener thread"""
         log_level = self.config.get('logging', {}).get('level', 'INFO')
-        log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        
-        logging.basicConfig(
-            level=getattr(logging, log_level),
-            format=log_format,
-            handlers=[
-                logging.FileHandler(f"logs/deployment_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"),
-                logging.StreamHandler()
-            ]
-        )
+        # Raw epoch timestamps avoid a strftime call per record
+        log_format = '%(created).3f %(name)s %(levelname)s %(message)s'
+        
         self.logger = logging.getLogger(__name__)
+        self.log_listener = None
+        
+        # Like basicConfig, only configure the root logger once per process
+        root_logger = logging.getLogger()
+        if any(isinstance(h, logging.handlers.QueueHandler) for h in root_logger.handlers):
+            return
+        root_logger.setLevel(getattr(logging, log_level))
+        
+        formatter = logging.Formatter(log_format)
+        output_handlers = [
+            logging.FileHandler(f"logs/deployment_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"),
+            logging.StreamHandler()
+        ]
+        for handler in output_handlers:
+            handler.setFormatter(formatter)
+        
+        # Producers only enqueue; formatting and I/O happen on the listener thread
+        log_queue = queue.Queue(-1)
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self.log_listener = logging.handlers.QueueListener(log_queue, *output_handlers)
+        self.log_listener.start()
+        atexit.register(self.shutdown_logging)
+
+    def shutdown_logging(self):
+        """Flush queued log records and stop the listener thread"""
+        if self.log_listener is not None:
+            self.log_listener.stop()
+            self.log_listener = None
+
+    def _query_node_vm_ids(self, node: ProxmoxNode) -> set:
+        """Return the set of VM IDs currently present on a single node"""
+        cmd = [
+            'pvesh', 'get', f'/nodes/{node.name}/qemu',
+            '--output-format', 'json'
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return {vm['vmid'] for vm in json.loads(result.stdout)}
 
     def get_next_available_vm_id(self, start_id: int = 500) -> int:
         """Query Proxmox for existing VM IDs and return next available ID"""
         try:
-            # Query all nodes for existing VM IDs
+            # Query all nodes concurrently for existing VM IDs
             existing_ids = set()
-            for node in self.nodes:
-                cmd = [
-                    'pvesh', 'get', f'/nodes/{node.name}/qemu',
-                    '--output-format', 'json'
-                ]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                vms = json.loads(result.stdout)
-                for vm in vms:
-                    existing_ids.add(vm['vmid'])
-            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.nodes))) as executor:
+                for node_ids in executor.map(self._query_node_vm_ids, self.nodes):
+                    existing_ids |= node_ids
+
             # Find next available ID starting from start_id
             current_id = start_id
             while current_id in existing_ids:
@@ -155,23 +239,62 @@ class DeploymentOrchestrator:
         
         return nodes
 
+    def _resolve_playbooks(self) -> List[str]:
+        """Return the Ansible playbooks present in the playbook directory, in run order"""
+        playbook_dir = self.config.get('ansible', {}).get('playbook_dir', 'ansible')
+        
+        available = []
+        for playbook in self.PRE_PLAYBOOKS + self.PARALLEL_PLAYBOOKS:
+            playbook_path = os.path.join(playbook_dir, playbook)
+            if os.path.exists(playbook_path):
+                available.append(playbook)
+            else:
+                self.logger.warning(f"Playbook not found: {playbook_path}")
+        
+        return available
+
     def load_users_from_csv(self, csv_file: str) -> List[User]:
         """Load users from CSV file"""
         users = []
         
         try:
             with open(csv_file, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    user = User(
-                        username=row['username'].strip(),
-                        email=row['email'].strip(),
-                        full_name=row['full_name'].strip(),
-                        department=row.get('department', '').strip()
-                    )
-                    users.append(user)
+                reader = csv.reader(f)
+                header = next(reader, None)
+                
+                # An empty file loads no users, as with DictReader
+                if header is not None:
+                    cols = {name.strip(): i for i, name in enumerate(header)}
+                    missing = [name for name in ('username', 'email', 'full_name') if name not in cols]
+                    if missing:
+                        raise ValueError(f"CSV file is missing columns: {', '.join(missing)}")
+                    
+                    # Resolve column indices once instead of building a dict per row
+                    username_col = cols['username']
+                    email_col = cols['email']
+                    full_name_col = cols['full_name']
+                    department_col = cols.get('department')
+                    required_len = max(username_col, email_col, full_name_col) + 1
+                    strip = str.strip
+                    append = users.append
+                    
+                    for row in reader:
+                        if not row:
+                            continue
+                        if len(row) < required_len:
+                            raise ValueError(
+                                f"CSV line {reader.line_num} has {len(row)} fields, expected at least {required_len}"
+                            )
+                        append(User(
+                            username=strip(row[username_col]),
+                            email=strip(row[email_col]),
+                            full_name=strip(row[full_name_col]),
+                            department=strip(row[department_col])
+                            if department_col is not None and department_col < len(row) else ''
+                        ))
                     
             self.users = users
+            self._vm_ids_map = None
             self.logger.info(f"Loaded {len(users)} users from {csv_file}")
             return users
             
@@ -190,120 +313,199 @@ class DeploymentOrchestrator:
         
         self.logger.info(f"Planning deployment: {total_users} users, {total_vms} VMs total")
         
-        # Simple round-robin distribution for now
+        # Greedy distribution: each VM goes to the node with the most headroom left in
+        # its scarcer resource (cores or memory, as a fraction of the node's total).
+        # Nodes that cannot fit the VM are skipped unless no node can fit it.
         node_assignments = {node.name: [] for node in self.nodes}
         node_names = [node.name for node in self.nodes]
+        total_cores = [node.available_cores or 1 for node in self.nodes]
+        total_memory = [node.available_memory_gb or 1 for node in self.nodes]
+        free_cores = [node.available_cores for node in self.nodes]
+        free_memory = [node.available_memory_gb for node in self.nodes]
+        node_indices = range(len(self.nodes))
+        
+        # Per-VM resource demands do not depend on the user, so resolve them once
+        template_demands = tuple(
+            (vm_type, self.templates[vm_type].cpu_cores, self.templates[vm_type].memory_mb / 1024)
+            for vm_type in self._template_names
+        )
         
-        for i, user in enumerate(self.users):
-            target_node = node_names[i % len(node_names)]
-            node_assignments[target_node].append(user)
-            
+        def headroom(i: int, cores: int, memory_gb: float) -> float:
+            return min((free_cores[i] - cores) / total_cores[i],
+                       (free_memory[i] - memory_gb) / total_memory[i])
+        
+        for user in self.users:
             # Assign VMs to nodes for this user
-            user.vm_assignments = {}
-            for j, vm_type in enumerate(self.templates.keys()):
-                vm_node = node_names[(i + j) % len(node_names)]
-                user.vm_assignments[vm_type] = vm_node
+            vm_assignments = user.vm_assignments = {}
+            for vm_type, cores, memory_gb in template_demands:
+                fitting = [i for i in node_indices
+                           if free_cores[i] >= cores and free_memory[i] >= memory_gb]
+                i = max(fitting or node_indices, key=lambda n: headroom(n, cores, memory_gb))
+                free_cores[i] -= cores
+                free_memory[i] -= memory_gb
+                vm_assignments[vm_type] = node_names[i]
+            
+            # Group users by the node hosting their first VM
+            if user.vm_assignments:
+                node_assignments[next(iter(user.vm_assignments.values()))].append(user)
+        
+        oversubscribed = [node_names[i] for i in node_indices
+                          if free_cores[i] < 0 or free_memory[i] < 0]
+        if oversubscribed:
+            self.logger.warning(f"Planned VMs exceed available capacity on nodes: {', '.join(oversubscribed)}")
         
         return node_assignments
 
-    def generate_vm_ids(self, start_id: int = None) -> Dict[str, int]:
-        """Generate unique VM IDs for deployment"""
+    def generate_vm_ids(self, start_id: int = None) -> Dict[str, Dict[str, int]]:
+        """Generate unique VM IDs for deployment, keyed by username then VM type"""
         if start_id is None:
-            start_id = self.get_next_available_vm_id(500)
+            # Continue after IDs handed out earlier in this run; they may not exist in Proxmox yet
+            if self._next_free_id is not None:
+                start_id = self._next_free_id
+            else:
+                start_id = self.get_next_available_vm_id(500)
         
-        vm_id_map = {}
+        vm_id_map: Dict[str, Dict[str, int]] = {}
         current_id = start_id
         
+        template_names = self._template_names
         for user in self.users:
-            for vm_type in self.templates.keys():
-                vm_key = f"{user.username}_{vm_type}"
-                vm_id_map[vm_key] = current_id
+            user_ids = {}
+            for vm_type in template_names:
+                user_ids[vm_type] = current_id
                 current_id += 1
+            vm_id_map[user.username] = user_ids
         
+        self._next_free_id = current_id
         return vm_id_map
 
+    @property
+    def _vm_ids(self) -> Dict[str, Dict[str, int]]:
+        """VM ID mapping for all loaded users, queried from Proxmox once per run"""
+        with self._vm_ids_lock:
+            if self._vm_ids_map is None:
+                self._vm_ids_map = self.generate_vm_ids()
+            return self._vm_ids_map
+
     def create_terraform_configs(self, user_batch: List[User], batch_id: str) -> str:
         """Generate Terraform configuration files for a batch of users"""
         batch_dir = f"terraform_batches/batch_{batch_id}"
         os.makedirs(batch_dir, exist_ok=True)
         
-        # Generate VM ID mapping
-        vm_ids = self.generate_vm_ids()
-        
         # Prepare template variables
         template_vars = {
             'users': user_batch,
             'vm_templates': self.templates,
-            'vm_ids': vm_ids,
+            'vm_ids': self._vm_ids,
             'proxmox_config': self.config.get('proxmox', {}),
             'batch_id': batch_id
         }
         
         # Generate main.tf
-        main_template = self.jinja_env.get_template('terraform/main.tf.j2')
         with open(f"{batch_dir}/main.tf", 'w') as f:
-            f.write(main_template.render(template_vars))
+            f.write(self._tf_main_tpl.render(template_vars))
         
-        # Generate variables.tf
-        variables_template = self.jinja_env.get_template('terraform/variables.tf.j2')
+        # Write pre-rendered variables.tf
         with open(f"{batch_dir}/variables.tf", 'w') as f:
-            f.write(variables_template.render(template_vars))
+            f.write(self._variables_tf_rendered)
         
-        # Generate terraform.tfvars
-        tfvars_template = self.jinja_env.get_template('terraform/terraform.tfvars.j2')
+        # Write pre-rendered terraform.tfvars
         with open(f"{batch_dir}/terraform.tfvars", 'w') as f:
-            f.write(tfvars_template.render(template_vars))
+            f.write(self._tfvars_rendered)
         
         self.logger.info(f"Generated Terraform configs for batch {batch_id}")
         return batch_dir
 
+    def _run_streaming(self, cmd: List[str], label: str, cwd: Optional[str] = None) -> None:
+        """Run a command, logging its combined output line by line as it arrives"""
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, bufsize=1, cwd=cwd) as proc:
+            for line in proc.stdout:
+                self.logger.info(f"[{label}] {line.rstrip()}")
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+    def _link_terraform_init_cache(self, batch_dir: str) -> bool:
+        """Link batch_dir to a shared Terraform init, returning True if this call ran the init"""
+        cache_dir = os.path.join(os.path.dirname(batch_dir), '_init_cache')
+        
+        with self._tf_init_lock:
+            # A failed shared init fails every later batch instead of being retried
+            if self._tf_init_error is not None:
+                raise self._tf_init_error
+            ran_init = not self._tf_init_done
+            if ran_init:
+                try:
+                    # The cache only needs the provider requirements, not any batch's resources
+                    os.makedirs(cache_dir, exist_ok=True)
+                    with open(os.path.join(cache_dir, 'main.tf'), 'w') as f:
+                        f.write(self._providers_tf_rendered)
+                    self._run_streaming(['terraform', 'init'], f"{os.path.basename(cache_dir)} terraform init",
+                                        cwd=cache_dir)
+                except (subprocess.CalledProcessError, OSError) as e:
+                    self._tf_init_error = e
+                    raise
+                self._tf_init_done = True
+        
+        for name in ('.terraform', '.terraform.lock.hcl'):
+            link = os.path.join(batch_dir, name)
+            if not os.path.lexists(link):
+                os.symlink(os.path.relpath(os.path.join(cache_dir, name), batch_dir), link)
+        
+        return ran_init
+
     def deploy_terraform_batch(self, batch_dir: str) -> bool:
         """Deploy a batch using Terraform"""
+        batch_name = os.path.basename(batch_dir)
         try:
-            original_cwd = os.getcwd()
-            os.chdir(batch_dir)
-            
-            # Initialize Terraform
-            result = subprocess.run(['terraform', 'init'], 
-                                  capture_output=True, text=True, check=True)
-            self.logger.info(f"Terraform init successful: {result.stdout}")
+            # Reuse the shared Terraform initialization
+            if self._link_terraform_init_cache(batch_dir):
+                self.logger.info(f"Terraform init successful for {batch_name} in _init_cache")
+            else:
+                self.logger.info(f"Reusing shared Terraform init from _init_cache for {batch_name}")
             
             # Plan deployment
-            result = subprocess.run(['terraform', 'plan', '-out=tfplan'], 
-                                  capture_output=True, text=True, check=True)
+            self._run_streaming(['terraform', 'plan', '-out=tfplan'], f"{batch_name} terraform plan", cwd=batch_dir)
             self.logger.info(f"Terraform plan successful")
             
             # Apply deployment
-            result = subprocess.run(['terraform', 'apply', 'tfplan'], 
-                                  capture_output=True, text=True, check=True)
-            self.logger.info(f"Terraform apply successful: {result.stdout}")
+            self._run_streaming(['terraform', 'apply', 'tfplan'], f"{batch_name} terraform apply", cwd=batch_dir)
+            self.logger.info(f"Terraform apply successful")
             
             # Get outputs
-            result = subprocess.run(['terraform', 'output', '-json'], 
+            result = subprocess.run(['terraform', 'output', '-json'], cwd=batch_dir,
                                   capture_output=True, text=True, check=True)
-            outputs = json.loads(result.stdout)
+            outputs_file = os.path.join(batch_dir, 'terraform_outputs.json')
             
             # Save outputs for Ansible
-            with open('terraform_outputs.json', 'w') as f:
-                json.dump(outputs, f, indent=2)
+            if orjson is not None:
+                outputs = orjson.loads(result.stdout)
+                with open(outputs_file, 'wb') as f:
+                    f.write(orjson.dumps(outputs, option=orjson.OPT_INDENT_2))
+            else:
+                outputs = json.loads(result.stdout)
+                with open(outputs_file, 'w') as f:
+                    json.dump(outputs, f, indent=2)
             
             return True
             
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Terraform deployment failed: {e.stderr}")
+            self.logger.error(f"Terraform deployment failed: {e.stderr or e}")
             return False
-        finally:
-            os.chdir(original_cwd)
 
     def generate_ansible_inventory(self, batch_dir: str) -> str:
         """Generate Ansible inventory from Terraform outputs"""
         try:
-            with open(f"{batch_dir}/terraform_outputs.json", 'r') as f:
-                terraform_outputs = json.load(f)
+            outputs_file = os.path.join(batch_dir, 'terraform_outputs.json')
+            if orjson is not None:
+                with open(outputs_file, 'rb') as f:
+                    terraform_outputs = orjson.loads(f.read())
+            else:
+                with open(outputs_file, 'r') as f:
+                    terraform_outputs = json.load(f)
             
             # Generate inventory
-            inventory_template = self.jinja_env.get_template('ansible/inventory.j2')
-            inventory_content = inventory_template.render({
+            inventory_content = self._ansible_inv_tpl.render({
                 'terraform_outputs': terraform_outputs,
                 'templates': self.templates
             })
@@ -319,38 +521,43 @@ class DeploymentOrchestrator:
             self.logger.error(f"Failed to generate Ansible inventory: {e}")
             raise
 
+    def _run_playbook(self, playbook: str, inventory_file: str, batch_dir: str) -> None:
+        """Run a single Ansible playbook against the batch inventory"""
+        ansible_config = self.config.get('ansible', {})
+        playbook_path = os.path.join(ansible_config.get('playbook_dir', 'ansible'), playbook)
+        
+        cmd = [
+            'ansible-playbook',
+            '-i', inventory_file,
+            playbook_path,
+            '--forks', str(ansible_config.get('forks', 10)),
+            '--extra-vars', f"batch_dir={batch_dir}"
+        ]
+        
+        self._run_streaming(cmd, f"{os.path.basename(batch_dir)} {playbook}")
+        self.logger.info(f"Successfully ran playbook {playbook}")
+
     def run_ansible_playbooks(self, inventory_file: str, batch_dir: str) -> bool:
         """Run Ansible playbooks for VM configuration"""
-        playbook_dir = self.config.get('ansible', {}).get('playbook_dir', 'ansible')
-        
-        playbooks = [
-            'base_configuration.yml',
-            'guacamole_integration.yml',
-            'netbox_integration.yml',
-            'freeipa_integration.yml'
-        ]
+        pre = [p for p in self._playbooks if p in self.PRE_PLAYBOOKS]
+        parallel = [p for p in self._playbooks if p in self.PARALLEL_PLAYBOOKS]
         
         try:
-            for playbook in playbooks:
-                playbook_path = f"{playbook_dir}/{playbook}"
-                if not os.path.exists(playbook_path):
-                    self.logger.warning(f"Playbook not found: {playbook_path}")
-                    continue
-                
-                cmd = [
-                    'ansible-playbook',
-                    '-i', inventory_file,
-                    playbook_path,
-                    '--extra-vars', f"batch_dir={batch_dir}"
+            for playbook in pre:
+                self._run_playbook(playbook, inventory_file, batch_dir)
+            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(parallel))) as executor:
+                futures = [
+                    executor.submit(self._run_playbook, playbook, inventory_file, batch_dir)
+                    for playbook in parallel
                 ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                self.logger.info(f"Successfully ran playbook {playbook}")
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
             
             return True
             
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Ansible playbook failed: {e.stderr}")
+            self.logger.error(f"Ansible playbook failed: {e}")
             return False
 
     def deploy_batch(self, user_batch: List[User], batch_id: str) -> bool:
@@ -379,6 +586,55 @@ class DeploymentOrchestrator:
             self.logger.error(f"Batch {batch_id} deployment failed: {e}")
             return False
 
+    def _query_node_pressure(self, node: ProxmoxNode) -> float:
+        """Return a node's current pressure (0-1) as the worst of CPU, IO wait and memory use"""
+        cmd = [
+            'pvesh', 'get', f'/nodes/{node.name}/status',
+            '--output-format', 'json'
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        status = json.loads(result.stdout)
+        memory = status.get('memory', {})
+        memory_used = memory.get('used', 0) / memory['total'] if memory.get('total') else 0.0
+        return max(status.get('cpu', 0.0), status.get('wait', 0.0), memory_used)
+
+    def update_node_load(self) -> Optional[float]:
+        """Fold current node pressure into each node's EWMA load and return the busiest node's load"""
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.nodes))) as executor:
+                pressures = list(executor.map(self._query_node_pressure, self.nodes))
+        except Exception as e:
+            self.logger.warning(f"Could not query node status: {e}")
+            return None
+        
+        # The first sample seeds the average so early readings are not biased toward idle
+        self.nodes = [
+            replace(node, current_load=pressure if node.current_load is None
+                    else 0.7 * node.current_load + 0.3 * pressure)
+            for node, pressure in zip(self.nodes, pressures)
+        ]
+        return max((node.current_load for node in self.nodes), default=None)
+
+    def _next_batch_size(self, batch_size: int, load: Optional[float]) -> int:
+        """Shrink the batch size under contention and grow it when the cluster is idle"""
+        tuning = self.config.get('batch_tuning', {})
+        if load is None:
+            return batch_size
+        
+        if load > tuning.get('high_load', 0.4):
+            new_size = min(batch_size, max(tuning.get('min_batch_size', 1), batch_size // 2))
+        elif load < tuning.get('low_load', 0.15):
+            # Grow by at least one user so small batches can recover, but never
+            # shrink on low load, even if started above max_batch_size
+            grown = max(batch_size + 1, math.ceil(batch_size * 1.5))
+            new_size = max(batch_size, min(tuning.get('max_batch_size', 60), grown))
+        else:
+            new_size = batch_size
+        
+        if new_size != batch_size:
+            self.logger.info(f"Cluster load {load:.2f}, adjusting batch size {batch_size} -> {new_size}")
+        return new_size
+
     def deploy_all_users(self, batch_size: int = 15) -> Dict[str, bool]:
         """Deploy VMs for all users in batches"""
         self.logger.info(f"Starting deployment for {len(self.users)} users in batches of {batch_size}")
@@ -386,34 +642,50 @@ class DeploymentOrchestrator:
         # Calculate load distribution
         load_distribution = self.calculate_load_distribution()
         
-        # Create user batches
-        user_batches = []
-        for i in range(0, len(self.users), batch_size):
-            batch = self.users[i:i + batch_size]
-            user_batches.append((batch, f"batch_{i // batch_size + 1:03d}"))
-        
-        # Deploy batches
+        # Deploy batches concurrently. Batches are cut from the user list only when a
+        # worker is free, so each one is sized from the latest observed cluster load.
+        # A failure lets in-flight batches finish but stops new ones from starting.
         results = {}
-        for batch_users, batch_id in user_batches:
-            success = self.deploy_batch(batch_users, batch_id)
-            results[batch_id] = success
-            
-            if not success:
-                self.logger.error(f"Batch {batch_id} failed, stopping deployment")
-                break
+        max_workers = self.config.get('max_parallel_batches', 4)
+        next_user = 0
+        batch_number = 0
+        failed = False
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            while futures or (next_user < len(self.users) and not failed):
+                while len(futures) < max_workers and next_user < len(self.users) and not failed:
+                    batch_number += 1
+                    batch_id = f"batch_{batch_number:03d}"
+                    batch = self.users[next_user:next_user + batch_size]
+                    next_user += len(batch)
+                    futures[executor.submit(self.deploy_batch, batch, batch_id)] = batch_id
+                    results[batch_id] = None
+                
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    batch_id = futures.pop(future)
+                    success = future.result()
+                    results[batch_id] = success
+                    
+                    if not success and not failed:
+                        self.logger.error(f"Batch {batch_id} failed, stopping deployment")
+                        failed = True
+                
+                if not failed and next_user < len(self.users):
+                    batch_size = self._next_batch_size(batch_size, self.update_node_load())
         
         return results
 
     def generate_deployment_report(self, results: Dict[str, bool]) -> str:
         """Generate deployment summary report"""
-        report_template = self.jinja_env.get_template('reports/deployment_summary.j2')
-        
         total_batches = len(results)
         successful_batches = sum(results.values())
         failed_batches = total_batches - successful_batches
+        timestamp = datetime.now()
         
-        report_content = report_template.render({
-            'timestamp': datetime.now(),
+        report_content = self._report_tpl.render({
+            'timestamp': timestamp,
             'total_users': len(self.users),
             'total_batches': total_batches,
             'successful_batches': successful_batches,
@@ -421,7 +693,7 @@ class DeploymentOrchestrator:
             'batch_results': results
         })
         
-        report_file = f"reports/deployment_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+        report_file = f"reports/deployment_report_{timestamp.strftime('%Y%m%d_%H%M%S')}.md"
         os.makedirs('reports', exist_ok=True)
         
         with open(report_file, 'w') as f:
@@ -437,7 +709,7 @@ def main():
     parser.add_argument('--users-csv', required=True, 
                        help='CSV file containing user information')
     parser.add_argument('--batch-size', type=int, default=15, 
-                       help='Number of users per deployment batch')
+                       help='Initial number of users per deployment batch (adjusted to cluster load)')
     parser.add_argument('--dry-run', action='store_true', 
                        help='Generate configs without deploying')
     